@@ -1,44 +1,69 @@
+from __future__ import annotations
+
 import argparse
 import datetime
+import functools
+import itertools
+import re
 import sys
-
-from openai import OpenAI
-from openai.types.chat import (
-    ChatCompletionAssistantMessageParam,
-    ChatCompletionMessageParam,
-    ChatCompletionUserMessageParam,
-)
-from rich.console import Console
-from rich.live import Live
-from rich.markdown import Markdown
-from rich.padding import Padding
-from rich.table import Table
-from rich.text import Text
+import textwrap
+import time
+from typing import TYPE_CHECKING, Iterable
 
 from hey import __version__
-from hey.context import Context, ContextClient
-from hey.settings import (
-    HEY_CURRENT_CONTEXT_FILE,
-    HEY_DEFAULT_MODEL_NAME,
-    HEY_ROOT_CONTEXT_FILE,
-    HYE_DEFAULT_PROFILE_NAME,
-    Profile,
-    init_settings,
-    load_settings,
-)
+
+if TYPE_CHECKING:
+    from markdown_it.token import Token
+    from openai.types.chat import (
+        ChatCompletionAssistantMessageParam,
+        ChatCompletionChunk,
+        ChatCompletionMessageParam,
+        ChatCompletionUserMessageParam,
+    )
+    from rich.markdown import Markdown
+
+    from hey.context import Context, ContextClient
+    from hey.settings import Profile
+
+_RANGE_PARAM_PATTERN = re.compile(r"(-?\d*):(-?\d*)")
+_FENCE_PATTERN = re.compile(r"^ {0,3}(?:```|~~~)", re.MULTILINE)
+_LIST_ITEM_PATTERN = re.compile(r"(?:[-+*]|\d+[.)])\s")
 
 
 def _truncate_lines(text: str, max_lines: int) -> str:
-    lines = text.splitlines()
-    if len(lines) <= max_lines:
+    position = -1
+    for _ in range(max_lines - 1):
+        position = text.find("\n", position + 1)
+        if position < 0:
+            return text
+    # The text fits when the rest has no line break other than a trailing one.
+    next_position = text.find("\n", position + 1)
+    if next_position < 0 or next_position == len(text) - 1:
         return text
-    return "\n".join(lines[: max_lines - 1]) + "..."
+    return text[: max(position, 0)] + "..."
+
+
+def _make_snippet(content: str, position: int, before: int = 10, max_length: int = 100) -> str:
+    prefix = ""
+    start = 0
+    if position > before:
+        prefix = "..."
+        start = position - before
+    end = start + max_length - len(prefix)
+    suffix = "..." if len(content) > end else ""
+    return prefix + content[start:end] + suffix
+
+
+def _format_datetime(dt: datetime.datetime) -> str:
+    # Same as dt.strftime("%Y-%m-%d %H:%M:%S") without going through strftime for every row.
+    return f"{dt.year:04d}-{dt.month:02d}-{dt.day:02d} {dt.hour:02d}:{dt.minute:02d}:{dt.second:02d}"
 
 
 def _parse_range_param(rangeparam: str) -> slice:
-    if ":" not in rangeparam or rangeparam.count(":") > 1:
+    match = _RANGE_PARAM_PATTERN.fullmatch(rangeparam)
+    if match is None:
         raise ValueError("Invalid range parameter")
-    start_str, end_str = rangeparam.split(":")
+    start_str, end_str = match.groups()
     start = int(start_str) if start_str else None
     end = int(end_str) if end_str else None
     return slice(start, end)
@@ -60,12 +85,32 @@ def _create_context(
     return context
 
 
+@functools.cache
+def _read_current_context_id() -> int | None:
+    from hey.settings import HEY_CURRENT_CONTEXT_FILE
+
+    try:
+        return int(HEY_CURRENT_CONTEXT_FILE.read_text())
+    except FileNotFoundError:
+        return None
+
+
+def _write_current_context_id(context_id: int | None) -> None:
+    from hey.settings import HEY_CURRENT_CONTEXT_FILE
+
+    if context_id is None:
+        HEY_CURRENT_CONTEXT_FILE.unlink(missing_ok=True)
+    else:
+        HEY_CURRENT_CONTEXT_FILE.write_text(str(context_id))
+    _read_current_context_id.cache_clear()
+
+
 def _get_context(
     client: ContextClient,
     context_id: int | None = None,
 ) -> Context | None:
-    if context_id is None and HEY_CURRENT_CONTEXT_FILE.exists():
-        context_id = int(HEY_CURRENT_CONTEXT_FILE.read_text())
+    if context_id is None:
+        context_id = _read_current_context_id()
 
     if context_id is not None:
         with client:
@@ -80,22 +125,85 @@ def _get_context(
     return context_or_not
 
 
-def _show_history(context: Context, messages: list[ChatCompletionMessageParam]) -> None:
+def _print_plain_rows(rows: Iterable[tuple[Context, list[tuple[str, str]]]]) -> None:
+    lines: list[str] = []
+    for context, previews in rows:
+        lines.append(f"{context.id}\t{context.title}\t{_format_datetime(context.created_at)}")
+        lines.extend(f"    {role}: {' '.join(text.split())}" for role, text in previews)
+    sys.stdout.write("".join(f"{line}\n" for line in lines))
+
+
+def _show_history(context: Context, messages: list[ChatCompletionMessageParam], plain: bool = False) -> None:
+    if plain:
+        lines = [f"[{context.id}: {context.title}]", ""]
+        for message in messages:
+            content = message["content"]
+            if not content or not isinstance(content, str):
+                continue
+            lines.extend((f"{message['role']}:", textwrap.indent(content, "    "), ""))
+        sys.stdout.write("".join(f"{line}\n" for line in lines))
+        return
+
+    from rich.console import Console, Group, RenderableType
+    from rich.markdown import Markdown
+    from rich.padding import Padding
+    from rich.text import Text
+
     console = Console()
-    console.print(f"[bold][{context.id}: {context.title}][/bold]")
-    console.print()
+    renderables: list[RenderableType] = [
+        console.render_str(f"[bold][{context.id}: {context.title}][/bold]"),
+        Text(),
+    ]
     for message in messages:
         role = message["role"]
         content = message["content"]
         if not content or not isinstance(content, str):
             continue
-        console.print(role, style="bold", end=":\n")
-        console.print(Padding(Markdown(content), (0, 4)))
-        console.print()
+        renderables.append(Text(f"{role}:", style="bold"))
+        renderables.append(Padding(Markdown(content), (0, 4)))
+        renderables.append(Text())
+    console.print(Group(*renderables))
 
 
-def _list_contexts(client: ContextClient, rangeparam: str) -> None:
+def _list_contexts(client: ContextClient, rangeparam: str, plain: bool = False) -> None:
     slice_ = _parse_range_param(rangeparam)
+    # Only one character more than a preview shows is read, enough to tell
+    # whether it has to be marked as cut.
+    max_length = 100 if plain else 500
+
+    with client:
+        if slice_.start is not None and slice_.start < 0 and (slice_.stop is None or slice_.stop < 0):
+            # Ranges such as `-10:` count from the newest context, so they are
+            # fetched in reverse instead of counting and skipping the older ones.
+            offset = -(slice_.stop or 0)
+            rows = client.get_contexts_with_preview(
+                offset=offset,
+                limit=max(-slice_.start - offset, 0),
+                from_end=True,
+                preview_length=max_length + 1,
+            )
+        else:
+            if (slice_.start or 0) < 0 or (slice_.stop or 0) < 0:
+                start, stop, _ = slice_.indices(client.count_contexts())
+            else:
+                start, stop = slice_.start or 0, slice_.stop
+            limit = None if stop is None else max(stop - start, 0)
+            rows = client.get_contexts_with_preview(offset=start, limit=limit, preview_length=max_length + 1)
+
+    if plain:
+        _print_plain_rows(
+            (
+                context,
+                [(role, _make_snippet(content, 0, max_length=max_length)) for role, content in messages if content],
+            )
+            for context, messages in rows
+        )
+        return
+
+    from rich.console import Console
+    from rich.markup import escape
+    from rich.table import Table
+    from rich.text import Text
 
     console = Console()
     table = Table(show_header=True, header_style="bold")
@@ -104,24 +212,48 @@ def _list_contexts(client: ContextClient, rangeparam: str) -> None:
     table.add_column("Summary")
     table.add_column("Created At")
 
-    with client:
-        for context in client.get_contexts()[slice_]:
-            messages = client.get_messages(context, limit=3)
-            summary = _truncate_lines(
-                "\n\n".join(f"**{message.role}**: {message.content}" for message in messages if message.content),
-                max_lines=5,
-            )
-            table.add_row(
-                str(context.id),
-                str(context.title),
-                Markdown(summary),
-                str(context.created_at.strftime("%Y-%m-%d %H:%M:%S")),
-            )
+    max_lines = 5
+    for context, messages in rows:
+        # Each message is cut before it is escaped and joined. Keeping two more
+        # lines than the summary shows leaves the final cut unchanged.
+        previews = [
+            (role, _truncate_lines(_make_snippet(content, 0, max_length=max_length), max_lines + 2))
+            for role, content in messages
+            if content
+        ]
+        summary = _truncate_lines(
+            "\n\n".join(f"[bold]{role}[/bold]: {escape(preview)}" for role, preview in previews),
+            max_lines=max_lines,
+        )
+        table.add_row(
+            str(context.id),
+            str(context.title),
+            Text.from_markup(summary),
+            _format_datetime(context.created_at),
+        )
 
     console.print(table)
 
 
-def _search_contexts(client: ContextClient, query: str) -> None:
+def _search_contexts(client: ContextClient, query: str, plain: bool = False) -> None:
+    rows: list[tuple[Context, list[tuple[str, str]]]] = []
+    with client:
+        for _, hits in itertools.groupby(client.search_messages(query), key=lambda hit: hit[0].id):
+            snippets: list[tuple[str, str]] = []
+            for context, message, position in hits:
+                if position >= 0:
+                    snippets.append((message.role, _make_snippet(message.content, position)))
+            rows.append((context, snippets))
+
+    if plain:
+        _print_plain_rows(rows)
+        return
+
+    from rich.console import Console
+    from rich.markup import escape
+    from rich.table import Table
+    from rich.text import Text
+
     console = Console()
     table = Table(show_header=True, header_style="bold")
     table.add_column("ID")
@@ -129,46 +261,30 @@ def _search_contexts(client: ContextClient, query: str) -> None:
     table.add_column("Messages")
     table.add_column("Created At")
 
-    with client:
-        for context in client.search_contexts(query):
-            messages = client.get_messages(context)
-            result = ""
-            for message in messages:
-                if message.content and query in message.content:
-                    content = message.content
-                    position = message.content.index(query)
-                    if position > 10:
-                        content = "..." + content[position - 10 :]
-                    if len(content) > 100:
-                        content = content[:100] + "..."
-                    result += f"- **{message.role}**: {content}\n"
-            table.add_row(
-                str(context.id),
-                str(context.title),
-                Markdown(result.strip()),
-                str(context.created_at.strftime("%Y-%m-%d %H:%M:%S")),
-            )
+    for context, snippets in rows:
+        table.add_row(
+            str(context.id),
+            str(context.title),
+            Text.from_markup("\n".join(f"• [bold]{role}[/bold]: {escape(snippet)}" for role, snippet in snippets)),
+            _format_datetime(context.created_at),
+        )
 
     console.print(table)
 
 
 def _delete_context(client: ContextClient, context: int | Context) -> None:
-    if isinstance(context, Context):
+    if not isinstance(context, int):
         assert context.id is not None
         context = context.id
     with client:
-        client.delete_context(context)
-        if HEY_CURRENT_CONTEXT_FILE.exists():
-            current_context_id = int(HEY_CURRENT_CONTEXT_FILE.read_text())
-            if current_context_id == context:
-                HEY_CURRENT_CONTEXT_FILE.unlink()
+        client.delete_contexts([context])
+        if _read_current_context_id() == context:
+            _write_current_context_id(None)
 
 
 def _undo(client: ContextClient, context: Context) -> None:
     with client:
-        message = client.delete_last_message(context)
-        while message is not None and message.role != "user":
-            message = client.delete_last_message(context)
+        client.delete_last_turn(context)
 
 
 def _rename_context(client: ContextClient, context: Context, new_name: str) -> None:
@@ -184,12 +300,108 @@ def _switch_context(client: ContextClient, context: int | Context) -> None:
                 _exit_with_error(f"Context {context} not found.")
                 return
             context = _context
-        HEY_CURRENT_CONTEXT_FILE.write_text(str(context.id))
-
-
-def main(prog: str | None = None) -> None:
-    parser = argparse.ArgumentParser()
-    parser.add_argument("inputs", nargs="*", help="input messages")
+        _write_current_context_id(context.id)
+
+
+def _write_stream(stream: Iterable[ChatCompletionChunk]) -> str:
+    parts: list[str] = []
+    for chunk in stream:
+        content = chunk.choices[0].delta.content
+        if content is not None:
+            parts.append(content)
+            sys.stdout.write(content)
+            sys.stdout.flush()
+    sys.stdout.write("\n")
+    return "".join(parts)
+
+
+class _MarkdownBlockScanner:
+    """Track where the complete top-level blocks of a growing markdown text end.
+
+    A block ends at a blank line that is followed by a complete, unindented line other than a list item (which
+    may continue a list) and is not inside a fenced code block. Each call to `feed` scans only the complete
+    lines added since the previous call, so the text must only grow between calls.
+    """
+
+    def __init__(self) -> None:
+        self.boundary = 0
+        self._position = 0
+        self._in_fence = False
+
+    def feed(self, text: str) -> int:
+        end = text.rfind("\n") + 1
+        position = self._position
+        while position < end:
+            if (
+                not self._in_fence
+                and position >= 2
+                and text.startswith("\n\n", position - 2)
+                and not text[position].isspace()
+                and not _LIST_ITEM_PATTERN.match(text, position)
+            ):
+                self.boundary = position
+            if _FENCE_PATTERN.match(text, position):
+                self._in_fence = not self._in_fence
+            position = text.index("\n", position) + 1
+        self._position = position
+        return self.boundary
+
+
+class _StreamingMarkdown:
+    """Render a growing markdown text, parsing its completed blocks only once.
+
+    Only the text after the last block boundary found by `_MarkdownBlockScanner` is parsed again on each call,
+    so the text must only grow between calls.
+    """
+
+    def __init__(self) -> None:
+        self._committed_tokens: list[Token] = []
+        self._committed_length = 0
+        self._scanner = _MarkdownBlockScanner()
+
+    def render(self, text: str) -> Markdown:
+        from rich.markdown import Markdown
+
+        boundary = self._scanner.feed(text)
+        if boundary > self._committed_length:
+            self._committed_tokens.extend(Markdown(text[self._committed_length : boundary]).parsed)
+            self._committed_length = boundary
+        markdown = Markdown(text[self._committed_length :])
+        markdown.parsed = self._committed_tokens + markdown.parsed
+        return markdown
+
+
+def _render_stream(stream: Iterable[ChatCompletionChunk]) -> str:
+    from rich.console import Console
+    from rich.live import Live
+    from rich.markdown import Markdown
+
+    streaming_markdown = _StreamingMarkdown()
+    # Re-rendering parses the tail of the response, so do not update more
+    # often than the live display is actually refreshed.
+    refresh_per_second = 10
+    parts: list[str] = []
+    with Live(Markdown(""), console=Console(), refresh_per_second=refresh_per_second) as live:
+        last_update = time.monotonic()
+        for chunk in stream:
+            content = chunk.choices[0].delta.content
+            if content is not None:
+                parts.append(content)
+                now = time.monotonic()
+                if now - last_update >= 1 / refresh_per_second:
+                    live.update(streaming_markdown.render("".join(parts)))
+                    last_update = now
+        response = "".join(parts)
+        # Parse the complete response once so the final output does not depend
+        # on where it was split while streaming.
+        live.update(Markdown(response))
+    return response
+
+
+def _build_parser(prog: str | None = None) -> argparse.ArgumentParser:
+    # Abbreviations are resolved only once the chat arguments are added, so that
+    # a prefix is never matched against the smaller set of command options.
+    parser = argparse.ArgumentParser(prog=prog, add_help=False, allow_abbrev=False, exit_on_error=False)
     parser.add_argument(
         "-n",
         "--new",
@@ -248,6 +460,34 @@ def main(prog: str | None = None) -> None:
         action="store_true",
         help="plain text mode",
     )
+    parser.add_argument(
+        "-p",
+        "--profile",
+        help="profile name",
+    )
+    parser.add_argument(
+        "--config",
+        help="path to config file",
+    )
+    parser.add_argument(
+        "-v",
+        "--version",
+        action="version",
+        version="%(prog)s " + __version__,
+    )
+    return parser
+
+
+def _add_chat_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.allow_abbrev = True
+    parser.exit_on_error = True
+    parser.add_argument(
+        "-h",
+        "--help",
+        action="help",
+        help="show this help message and exit",
+    )
+    parser.add_argument("inputs", nargs="*", help="input messages")
     parser.add_argument(
         "-m",
         "--model",
@@ -265,141 +505,186 @@ def main(prog: str | None = None) -> None:
         action="store_true",
         help="disable streaming",
     )
-    parser.add_argument(
-        "-p",
-        "--profile",
-        default=HYE_DEFAULT_PROFILE_NAME,
-        help="profile name",
-    )
-    parser.add_argument(
-        "--config",
-        help="path to config file",
+
+
+def _is_command(args: argparse.Namespace) -> bool:
+    return bool(
+        args.list or args.search or args.switch is not None or args.history or args.rename or args.undo or args.delete
     )
-    parser.add_argument(
-        "-v",
-        "--version",
-        action="version",
-        version="%(prog)s " + __version__,
+
+
+def _parse_args(prog: str | None, argv: list[str]) -> argparse.Namespace:
+    # The common invocation only passes the message, so its arguments are
+    # built without constructing the parser at all.
+    if not any(arg.startswith("-") for arg in argv):
+        return argparse.Namespace(
+            new=None,
+            context=None,
+            history=False,
+            list=None,
+            search=None,
+            delete=False,
+            switch=None,
+            undo=False,
+            rename=None,
+            plain=False,
+            profile=None,
+            config=None,
+            inputs=argv,
+            model=None,
+            temperature=None,
+            no_stream=False,
+        )
+
+    # Commands other than chatting only need the arguments registered by
+    # `_build_parser`, so the chat arguments are added only when required.
+    parser = _build_parser(prog)
+    try:
+        args, unknown_args = parser.parse_known_args(argv)
+    except argparse.ArgumentError:
+        args, unknown_args = None, None
+    if args is None or unknown_args or not _is_command(args):
+        _add_chat_arguments(parser)
+        args = parser.parse_args(argv)
+    return args
+
+
+def main(prog: str | None = None) -> None:
+    args = _parse_args(prog, sys.argv[1:])
+
+    # `--help` and `--version` exit while parsing, so settings, the database
+    # and the API client are only imported once there is work to do.
+    from hey.settings import (
+        HEY_DEFAULT_MODEL_NAME,
+        HEY_ROOT_CONTEXT_FILE,
+        HYE_DEFAULT_PROFILE_NAME,
+        init_settings,
+        load_settings,
     )
-    args = parser.parse_args()
 
     init_settings()
 
-    settings = load_settings(args.config)
-    if args.profile not in settings.profiles:
-        _exit_with_error(f"Profile {args.profile} not found.")
-        return
-    profile = settings.profiles[args.profile]
-
-    context_client = ContextClient(HEY_ROOT_CONTEXT_FILE)
+    plain = args.plain or not sys.stdout.isatty()
 
-    if args.list:
-        _list_contexts(context_client, args.list)
-        return
+    from hey.context import ContextClient
 
-    if args.search:
-        _search_contexts(context_client, args.search)
-        return
+    context_client = ContextClient(HEY_ROOT_CONTEXT_FILE)
 
-    if args.switch is not None:
-        _switch_context(context_client, args.switch)
-        return
+    # One session is shared by every step of the command.
+    with context_client:
+        # These commands only read or point at stored contexts, so they are
+        # dispatched before the settings file is loaded.
+        if args.list:
+            _list_contexts(context_client, args.list, plain)
+            return
 
-    if args.new is not None:
-        context = _create_context(context_client, profile, args.new)
-        _switch_context(context_client, context)
-    else:
-        context_or_not = _get_context(
-            context_client,
-            context_id=args.context,
-        )
-        if context_or_not is None:
-            _exit_with_error("No context found.")
+        if args.search:
+            _search_contexts(context_client, args.search, plain)
             return
-        context = context_or_not
 
-    with context_client:
-        messages = context_client.get_messages(context)
-    prompt = [message.to_message_param() for message in messages]
+        if args.switch is not None:
+            _switch_context(context_client, args.switch)
+            return
 
-    if args.history:
-        _show_history(context, prompt)
-        return
+        profile_name = args.profile or HYE_DEFAULT_PROFILE_NAME
+        settings = load_settings(args.config)
+        if profile_name not in settings.profiles:
+            _exit_with_error(f"Profile {profile_name} not found.")
+            return
+        profile = settings.profiles[profile_name]
 
-    if args.rename:
-        _rename_context(context_client, context, args.rename)
-        return
+        if args.new is not None:
+            context = _create_context(context_client, profile, args.new)
+            _switch_context(context_client, context)
+        else:
+            context_or_not = _get_context(
+                context_client,
+                context_id=args.context,
+            )
+            if context_or_not is None:
+                _exit_with_error("No context found.")
+                return
+            context = context_or_not
 
-    if args.undo:
-        _undo(context_client, context)
-        return
+        if args.history:
+            messages = context_client.get_message_params(context)
+            _show_history(context, messages, plain)
+            return
 
-    if args.delete:
-        _delete_context(context_client, context)
-        return
+        if args.rename:
+            _rename_context(context_client, context, args.rename)
+            return
 
-    if (
-        settings.suggest_new_context_after is not None
-        and messages
-        and datetime.datetime.now() - messages[-1].created_at > settings.suggest_new_context_after
-    ):
-        if (
-            input(
-                f"The last message in this context ({context.title}) was sent long ago.\n"
-                "Do you want to start a new context? [y/N]: ",
-            ).lower()
-            == "y"
-        ):
-            context = _create_context(context_client, profile, "")
-            _switch_context(context_client, context)
-            messages = []
+        if args.undo:
+            _undo(context_client, context)
+            return
 
-    text = " ".join(args.inputs)
-    if not sys.stdin.isatty():
-        text_from_stdin = sys.stdin.read().strip()
-        if text:
-            text = f"{text}\n\n```\n{text_from_stdin}\n```"
-        else:
-            text = text_from_stdin
+        if args.delete:
+            _delete_context(context_client, context)
+            return
 
-    if not text:
-        return
+        if settings.suggest_new_context_after is not None:
+            last_message = context_client.get_last_message(context)
+            if (
+                last_message is not None
+                and datetime.datetime.now() - last_message.created_at > settings.suggest_new_context_after
+            ):
+                if (
+                    input(
+                        f"The last message in this context ({context.title}) was sent long ago.\n"
+                        "Do you want to start a new context? [y/N]: ",
+                    ).lower()
+                    == "y"
+                ):
+                    context = _create_context(context_client, profile, "")
+                    _switch_context(context_client, context)
+
+        text = " ".join(args.inputs)
+        if not sys.stdin.isatty():
+            text_from_stdin = sys.stdin.read().strip()
+            if text:
+                text = f"{text}\n\n```\n{text_from_stdin}\n```"
+            else:
+                text = text_from_stdin
+
+        if not text:
+            return
 
-    openai_client = OpenAI(
-        base_url=profile.base_url,  # type: ignore[arg-type]
-        api_key=profile.api_key,
-    )
+        prompt = context_client.get_message_params(context)
 
-    user_message: ChatCompletionUserMessageParam = {"role": "user", "content": text}
-    prompt.append(user_message)
+        from openai import OpenAI
 
-    response = ""
-    console = Console()
-    render = Text if args.plain else Markdown
-    if args.no_stream:
-        result = openai_client.chat.completions.create(
-            model=args.model or profile.model or HEY_DEFAULT_MODEL_NAME,
-            messages=prompt,
-            temperature=args.temperature or profile.temperature,
-            stream=False,
-        )
-        response = result.choices[0].message.content or ""
-        console.print(render(response))
-    else:
-        stream = openai_client.chat.completions.create(
-            model=args.model or profile.model or HEY_DEFAULT_MODEL_NAME,
-            messages=prompt,
-            temperature=args.temperature or profile.temperature,
-            stream=True,
+        openai_client = OpenAI(
+            base_url=profile.base_url,  # type: ignore[arg-type]
+            api_key=profile.api_key,
         )
 
-        with Live(render(response), console=console, refresh_per_second=10) as live:
-            for chunk in stream:
-                content = chunk.choices[0].delta.content
-                if content is not None:
-                    response += content
-                    live.update(render(response))
+        user_message: ChatCompletionUserMessageParam = {"role": "user", "content": text}
+        prompt.append(user_message)
 
-    system_message: ChatCompletionAssistantMessageParam = {"role": "assistant", "content": response}
-    with context_client:
+        if args.no_stream:
+            result = openai_client.chat.completions.create(
+                model=args.model or profile.model or HEY_DEFAULT_MODEL_NAME,
+                messages=prompt,
+                temperature=args.temperature or profile.temperature,
+                stream=False,
+            )
+            response = result.choices[0].message.content or ""
+            if plain:
+                print(response)
+            else:
+                from rich.console import Console
+                from rich.markdown import Markdown
+
+                Console().print(Markdown(response))
+        else:
+            stream = openai_client.chat.completions.create(
+                model=args.model or profile.model or HEY_DEFAULT_MODEL_NAME,
+                messages=prompt,
+                temperature=args.temperature or profile.temperature,
+                stream=True,
+            )
+            response = _write_stream(stream) if plain else _render_stream(stream)
+
+        system_message: ChatCompletionAssistantMessageParam = {"role": "assistant", "content": response}
         context_client.add_messages(context, [user_message, system_message])
@@ -1,31 +1,33 @@
 import datetime
+import itertools
 from os import PathLike
 from types import TracebackType
-from typing import Sequence, cast
+from typing import TYPE_CHECKING, Any, Final, Iterable, Iterator, Sequence, cast
 
-from openai.types.chat import ChatCompletionMessageParam, ChatCompletionRole
-from sqlmodel import Field, Relationship, Session, SQLModel, create_engine, desc, select
+from sqlalchemy import ColumnElement, Engine, and_, column, event, insert, table
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import aliased
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Field, Relationship, Session, SQLModel, col, create_engine, delete, desc, func, select
 from sqlmodel.sql.expression import Select
 
+if TYPE_CHECKING:
+    from openai.types.chat import ChatCompletionMessageParam
+
 
 class Message(SQLModel, table=True):
     __tablename__ = "messages"
 
     id: int | None = Field(default=None, primary_key=True)
-    context_id: int = Field(foreign_key="contexts.id")
+    # Messages are read per context in id order, which an index on `context_id`
+    # alone provides because SQLite appends the rowid to every index entry.
+    context_id: int = Field(foreign_key="contexts.id", index=True)
     role: str
     content: str
     created_at: datetime.datetime = Field(default_factory=datetime.datetime.now)
     updated_at: datetime.datetime = Field(default_factory=datetime.datetime.now)
 
-    context: "Context" = Relationship(back_populates="messages")
-
-    def to_message_param(self) -> ChatCompletionMessageParam:
-        param = {
-            "role": cast(ChatCompletionRole, self.role),
-            "content": self.content,
-        }
-        return cast(ChatCompletionMessageParam, param)
+    context: "Context" = Relationship(back_populates="messages", sa_relationship_kwargs={"lazy": "raise"})
 
 
 class Context(SQLModel, table=True):
@@ -33,22 +35,92 @@ class Context(SQLModel, table=True):
 
     id: int | None = Field(default=None, primary_key=True)
     title: str
-    created_at: datetime.datetime = Field(default_factory=datetime.datetime.now)
+    created_at: datetime.datetime = Field(default_factory=datetime.datetime.now, index=True)
+
+    messages: list[Message] = Relationship(
+        back_populates="context",
+        sa_relationship_kwargs={"cascade": "all, delete", "lazy": "raise"},
+    )
+
+
+# A trigram index over message contents. SQLite answers `LIKE '%text%'` on this
+# table from the index when the pattern has at least three characters, and
+# falls back to scanning `messages` otherwise.
+_MESSAGES_FTS_SCHEMA: Final = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts"
+    " USING fts5(content, content='messages', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN"
+    " INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN"
+    " INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN"
+    " INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);"
+    " INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); END",
+    "INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')",
+)
+
 
-    messages: list[Message] = Relationship(back_populates="context", sa_relationship_kwargs={"cascade": "all, delete"})
+def _configure_sqlite_connection(dbapi_connection: Any, connection_record: Any) -> None:
+    # With WAL, commits append to the log and only need to sync it at checkpoints.
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode = WAL")
+    cursor.execute("PRAGMA synchronous = NORMAL")
+    cursor.close()
+
+
+_MAX_ROWID: Final = 2**63 - 1
+
+# Indexes created by earlier schema versions that are no longer used.
+_OBSOLETE_INDEXES: Final = ("ix_messages_context_id_created_at",)
+
+_messages_fts = table("messages_fts", column("rowid"), column("content"))
 
 
 class ContextClient:
-    def __init__(self, sqlite_filename: str | PathLike) -> None:
-        self._engine = create_engine(f"sqlite:///{sqlite_filename}")
-        SQLModel.metadata.create_all(self._engine)
+    # Stored in `PRAGMA user_version` once the schema has been created, so that
+    # opening an up-to-date database costs a single pragma read instead of DDL.
+    SCHEMA_VERSION = 4
 
+    def __init__(self, sqlite_filename: str | PathLike) -> None:
+        self._sqlite_filename = sqlite_filename
+        self._internal_engine: Engine | None = None
         self._internal_session: Session | None = None
+        self._session_depth = 0
+        self._internal_has_messages_fts: bool | None = None
+
+    @property
+    def _engine(self) -> Engine:
+        if self._internal_engine is None:
+            engine = create_engine(
+                f"sqlite:///{self._sqlite_filename}",
+                connect_args={"check_same_thread": False},
+                poolclass=StaticPool,
+            )
+            event.listen(engine, "connect", _configure_sqlite_connection)
+            with engine.begin() as connection:
+                if connection.exec_driver_sql("PRAGMA user_version").scalar_one() < self.SCHEMA_VERSION:
+                    for index_name in _OBSOLETE_INDEXES:
+                        connection.exec_driver_sql(f"DROP INDEX IF EXISTS {index_name}")
+                    SQLModel.metadata.create_all(connection)
+                    # `create_all` skips the indexes of tables that already exist.
+                    for metadata_table in SQLModel.metadata.sorted_tables:
+                        for index in metadata_table.indexes:
+                            index.create(connection, checkfirst=True)
+                    try:
+                        for statement in _MESSAGES_FTS_SCHEMA:
+                            connection.exec_driver_sql(statement)
+                    except OperationalError:
+                        # SQLite built without FTS5 or older than 3.34 (trigram tokenizer).
+                        pass
+                    connection.exec_driver_sql(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+            self._internal_engine = engine
+        return self._internal_engine
 
     def __enter__(self) -> "ContextClient":
-        if self._internal_session is not None:
-            raise RuntimeError("Already in a session")
-        self._internal_session = Session(self._engine)
+        # Nested `with` blocks share the outermost session.
+        if self._session_depth == 0:
+            self._internal_session = Session(self._engine)
+        self._session_depth += 1
         return self
 
     def __exit__(
@@ -59,8 +131,25 @@ class ContextClient:
     ) -> None:
         if self._internal_session is None:
             raise RuntimeError("Not in a session")
-        self._internal_session.close()
-        self._internal_session = None
+        self._session_depth -= 1
+        if self._session_depth == 0:
+            self._internal_session.close()
+            self._internal_session = None
+
+    @property
+    def _has_messages_fts(self) -> bool:
+        if self._internal_has_messages_fts is None:
+            result = self._session.connection().exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+            )
+            self._internal_has_messages_fts = result.first() is not None
+        return self._internal_has_messages_fts
+
+    def _message_contains(self, text: str) -> ColumnElement[bool]:
+        pattern = f"%{text}%"
+        if self._has_messages_fts:
+            return col(Message.id).in_(select(_messages_fts.c.rowid).where(_messages_fts.c.content.like(pattern)))
+        return col(Message.content).like(pattern)
 
     @property
     def _session(self) -> Session:
@@ -71,7 +160,7 @@ class ContextClient:
     def create_context(
         self,
         title: str,
-        prompt: Sequence[ChatCompletionMessageParam] = (),
+        prompt: Sequence["ChatCompletionMessageParam"] = (),
     ) -> Context:
         context = Context(title=title)
         self._session.add(context)
@@ -87,14 +176,19 @@ class ContextClient:
             if _context is None:
                 return None
             context = _context
-        self._session.delete(context)
-        self._session.commit()
+        self.delete_contexts([context])
         return context
 
+    def delete_contexts(self, contexts: Iterable[int | Context]) -> None:
+        context_ids = [context if isinstance(context, int) else context.id for context in contexts]
+        self._session.exec(delete(Message).where(col(Message.context_id).in_(context_ids)))  # type: ignore[call-overload]
+        self._session.exec(delete(Context).where(col(Context.id).in_(context_ids)))  # type: ignore[call-overload]
+        self._session.commit()
+
     def add_message(
         self,
         context: Context,
-        message: Message | ChatCompletionMessageParam,
+        message: "Message | ChatCompletionMessageParam",
     ) -> Message:
         if not isinstance(message, Message):
             message = Message(
@@ -110,36 +204,56 @@ class ContextClient:
     def add_messages(
         self,
         context: Context,
-        messages: Sequence[Message | ChatCompletionMessageParam],
-    ) -> Sequence[Message]:
+        messages: Sequence["Message | ChatCompletionMessageParam"],
+    ) -> None:
         assert context.id is not None
-        _messages = []
+        now = datetime.datetime.now()
+        rows: list[dict[str, Any]] = []
         for message in messages:
-            if not isinstance(message, Message):
-                message = Message(
-                    name=message.get("name"),
-                    role=message["role"],
-                    content=message["content"],
-                    context_id=context.id,
-                )
-            message.context_id = context.id
-            self._session.add(message)
-            _messages.append(message)
+            row: dict[str, Any]
+            if isinstance(message, Message):
+                row = {"role": message.role, "content": message.content, "created_at": message.created_at}
+            else:
+                row = {"role": message["role"], "content": message["content"], "created_at": now}
+            rows.append({**row, "context_id": context.id, "updated_at": now})
+        if not rows:
+            return
+        # A single executemany INSERT instead of one flush per message. No RETURNING,
+        # which SQLite supports only since 3.35.
+        self._session.connection().execute(insert(Message), rows)
         self._session.commit()
-        return _messages
 
     def delete_last_message(self, context: int | Context) -> Message | None:
         if isinstance(context, Context):
             assert context.id is not None
             context = context.id
-        query = select(Message).where(Message.context_id == context).order_by(desc(Message.created_at))
-        message = self._session.exec(query).first()
+        message = self.get_last_message(context)
         if message is None:
             return None
         self._session.delete(message)
         self._session.commit()
         return message
 
+    def delete_last_turn(self, context: int | Context) -> int:
+        """Delete the last user message and every message after it, and return the number of deleted messages.
+
+        All messages are deleted when the context has no user message.
+        """
+        if isinstance(context, Context):
+            assert context.id is not None
+            context = context.id
+        last_user_message_id = (
+            select(func.max(Message.id)).where(Message.context_id == context, Message.role == "user").scalar_subquery()
+        )
+        result = self._session.exec(
+            delete(Message).where(  # type: ignore[call-overload]
+                col(Message.context_id) == context,
+                col(Message.id) >= func.coalesce(last_user_message_id, 0),
+            )
+        )
+        self._session.commit()
+        return int(result.rowcount)
+
     def get_context(self, context_id: int) -> Context | None:
         return self._session.get(Context, context_id)
 
@@ -166,13 +280,28 @@ class ContextClient:
         messages = self._session.exec(query).all()
         return messages
 
+    def get_message_params(self, context: int | Context) -> list["ChatCompletionMessageParam"]:
+        if isinstance(context, Context):
+            assert context.id is not None
+            context = context.id
+        query = select(Message.role, Message.content).where(Message.context_id == context).order_by(col(Message.id))
+        params = [{"role": role, "content": content} for role, content in self._session.exec(query)]
+        return cast("list[ChatCompletionMessageParam]", params)
+
+    def get_last_message(self, context: int | Context) -> Message | None:
+        if isinstance(context, Context):
+            assert context.id is not None
+            context = context.id
+        query = select(Message).where(Message.context_id == context).order_by(desc(Message.created_at))
+        return self._session.exec(query).first()
+
     def get_contexts(
         self,
         *,
         offset: int | None = None,
         limit: int | None = None,
     ) -> Sequence[Context]:
-        query = cast(Select[Context], select(Context))
+        query = cast(Select[Context], select(Context).order_by(col(Context.id)))
         if offset is not None:
             query = query.offset(offset)
         if limit is not None:
@@ -180,6 +309,61 @@ class ContextClient:
         contexts = self._session.exec(query).all()
         return contexts
 
+    def get_contexts_with_preview(
+        self,
+        *,
+        offset: int | None = None,
+        limit: int | None = None,
+        from_end: bool = False,
+        preview_limit: int = 3,
+        preview_length: int | None = None,
+    ) -> list[tuple[Context, list[tuple[str, str]]]]:
+        """Fetch contexts with the role and content of their first messages in a single query.
+
+        With `from_end`, `offset` and `limit` count from the newest context, but the
+        result is still in ascending order. Contents are cut to their first
+        `preview_length` characters by SQLite when it is given.
+        """
+        # The id of the last previewed message of each context is looked up once
+        # per context from the `context_id` index, which is in id order. Contexts
+        # with fewer messages have no such id and show all of them.
+        last_preview_id = (
+            select(col(Message.id))
+            .where(Message.context_id == Context.id)
+            .order_by(col(Message.id))
+            .offset(preview_limit - 1)
+            .limit(1)
+            .scalar_subquery()
+        )
+        page_query = select(Context, func.coalesce(last_preview_id, _MAX_ROWID).label("last_preview_id")).order_by(
+            desc(Context.id) if from_end else col(Context.id)
+        )
+        if offset is not None:
+            page_query = page_query.offset(offset)
+        if limit is not None:
+            page_query = page_query.limit(limit)
+        page = page_query.subquery()
+        context = aliased(Context, page)
+        content = (
+            col(Message.content)
+            if preview_length is None
+            else func.substr(Message.content, 1, preview_length).label("content")
+        )
+        query = (
+            select(context, col(Message.role), content)
+            .outerjoin(Message, and_(col(Message.context_id) == page.c.id, col(Message.id) <= page.c.last_preview_id))
+            .order_by(page.c.id, col(Message.id))
+        )
+        rows: list[tuple[Context, list[tuple[str, str]]]] = []
+        for _, group in itertools.groupby(self._session.exec(query), key=lambda row: row[0].id):
+            group_rows = list(group)
+            messages = [(role, content) for _, role, content in group_rows if role is not None]
+            rows.append((group_rows[0][0], messages))
+        return rows
+
+    def count_contexts(self) -> int:
+        return self._session.exec(select(func.count()).select_from(Context)).one()
+
     def search_contexts(
         self,
         text: str,
@@ -187,7 +371,12 @@ class ContextClient:
         offset: int | None = None,
         limit: int | None = None,
     ) -> Sequence[Context]:
-        query = cast(Select[Context], select(Context).where(select(Message).where(Message.context_id == Context.id).where(Message.content.like(f"%{text}%")).exists()))  # type: ignore[attr-defined]
+        query = cast(
+            Select[Context],
+            select(Context).where(
+                select(Message).where(Message.context_id == Context.id).where(self._message_contains(text)).exists()
+            ),
+        )
         if offset is not None:
             query = query.offset(offset)
         if limit is not None:
@@ -195,6 +384,22 @@ class ContextClient:
         contexts = self._session.exec(query).all()
         return contexts
 
+    def search_messages(self, text: str, *, batch_size: int = 100) -> Iterator[tuple[Context, Message, int]]:
+        """Iterate over messages containing `text` with their contexts and the match offsets.
+
+        The offset is the case-sensitive position of `text` in the message content, or -1
+        when the message only matches case-insensitively. Rows are fetched in batches of
+        `batch_size`, so the iterator has to be consumed within the session.
+        """
+        query = (
+            select(Context, Message, func.instr(Message.content, text) - 1)
+            .join(Message, col(Message.context_id) == Context.id)
+            .where(self._message_contains(text))
+            .order_by(col(Context.id), col(Message.id))
+            .execution_options(yield_per=batch_size)
+        )
+        return iter(self._session.exec(query))
+
     def rename_context(self, context: int | Context, title: str) -> Context:
         if isinstance(context, int):
             _context = self._session.get(Context, context)
@@ -1,24 +1,29 @@
 from __future__ import annotations
 
+import dataclasses
 import os
+import pickle
 from datetime import timedelta
 from os import PathLike
 from pathlib import Path
-from typing import Final, Sequence
+from typing import TYPE_CHECKING, Any, Final, Sequence
 
-import yaml
-from openai.types.chat import ChatCompletionMessageParam
-from pydantic import BaseModel
+from hey import __version__
+
+if TYPE_CHECKING:
+    from openai.types.chat import ChatCompletionMessageParam
 
 HEY_ROOT_CONFIG_DIR: Final = Path.home() / ".hey"
 HEY_ROOT_CONFIG_FILE: Final = HEY_ROOT_CONFIG_DIR / "config.yml"
 HEY_ROOT_CONTEXT_FILE: Final = HEY_ROOT_CONFIG_DIR / "context.db"
+HEY_SETTINGS_CACHE_FILE: Final = HEY_ROOT_CONFIG_DIR / "config.cache"
 HEY_CURRENT_CONTEXT_FILE: Final = HEY_ROOT_CONFIG_DIR / "CURRENT_CONTEXT"
 HEY_DEFAULT_MODEL_NAME: Final = "gpt-3.5-turbo"
 HYE_DEFAULT_PROFILE_NAME: Final = os.getenv("HEY_PROFILE", "default")
 
 
-class Profile(BaseModel):
+@dataclasses.dataclass(slots=True)
+class Profile:
     base_url: str | None = None
     api_key: str | None = None
     model: str | None = None
@@ -26,32 +31,90 @@ class Profile(BaseModel):
     prompt: Sequence[ChatCompletionMessageParam] = ()
 
 
-class Settings(BaseModel):
-    profiles: dict[str, Profile] = {}
+@dataclasses.dataclass(slots=True)
+class Settings:
+    profiles: dict[str, Profile] = dataclasses.field(default_factory=dict)
     suggest_new_context_after: timedelta | None = None
 
 
-_DEFAULT_PROFILE = Profile()
-_DEFAULT_SETTINGS: Final = Settings(
-    profiles={
-        "default": _DEFAULT_PROFILE,
-    },
-)
+_PROFILE_FIELD_NAMES: Final = frozenset(field.name for field in dataclasses.fields(Profile))
+
+
+def _parse_timedelta(value: Any) -> timedelta:
+    """Validate a duration exactly like the former pydantic `timedelta` field did."""
+    from pydantic import TypeAdapter
+
+    return TypeAdapter(timedelta).validate_python(value)
+
+
+def _build_profile(data: dict[str, Any]) -> Profile:
+    # Unknown keys are ignored, so that configs written for other versions still load.
+    profile = Profile(**{key: value for key, value in data.items() if key in _PROFILE_FIELD_NAMES})
+    if profile.temperature is not None:
+        profile.temperature = float(profile.temperature)
+    return profile
+
+
+def _build_settings(data: dict[str, Any]) -> Settings:
+    suggest_new_context_after = data.get("suggest_new_context_after")
+    return Settings(
+        profiles={name: _build_profile(profile or {}) for name, profile in (data.get("profiles") or {}).items()},
+        suggest_new_context_after=(
+            None if suggest_new_context_after is None else _parse_timedelta(suggest_new_context_after)
+        ),
+    )
 
 
 def init_settings() -> None:
     HEY_ROOT_CONFIG_DIR.mkdir(parents=True, exist_ok=True)
 
 
+def _parse_settings(path: Path) -> Settings:
+    import yaml
+
+    try:
+        from yaml import CSafeLoader as Loader
+    except ImportError:
+        from yaml import SafeLoader as Loader  # type: ignore[assignment]
+
+    with open(path) as f:
+        settings = _build_settings(yaml.load(f, Loader=Loader) or {})
+    if "default" not in settings.profiles:
+        settings.profiles["default"] = Profile()
+    return settings
+
+
+def _load_cached_settings(path: Path) -> Settings:
+    """Parse the settings file, reusing the result pickled by a previous run while the file is unchanged."""
+    stat = path.stat()
+    key = (str(path.resolve()), stat.st_mtime_ns, stat.st_size, __version__)
+    try:
+        with open(HEY_SETTINGS_CACHE_FILE, "rb") as f:
+            cached_key, cached_settings = pickle.load(f)
+        if cached_key == key and isinstance(cached_settings, Settings):
+            return cached_settings
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError, TypeError, ValueError):
+        pass
+
+    settings = _parse_settings(path)
+    try:
+        # The cache holds API keys, so only its owner may read it.
+        temporary_file = HEY_SETTINGS_CACHE_FILE.with_suffix(f".{os.getpid()}.tmp")
+        temporary_file.unlink(missing_ok=True)
+        fd = os.open(temporary_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump((key, settings), f)
+        os.replace(temporary_file, HEY_SETTINGS_CACHE_FILE)
+    except OSError:
+        pass
+    return settings
+
+
 def load_settings(filename: str | PathLike | None = None) -> Settings:
     settings: Settings
     if filename is None:
         if not HEY_ROOT_CONFIG_FILE.exists():
-            settings = _DEFAULT_SETTINGS.copy()
+            settings = Settings(profiles={"default": Profile()})
             return settings
         filename = HEY_ROOT_CONFIG_FILE
-    with open(filename) as f:
-        settings = Settings(**yaml.safe_load(f))
-        if "default" not in settings.profiles:
-            settings.profiles["default"] = _DEFAULT_PROFILE.copy()
-        return settings
+    return _load_cached_settings(Path(filename))
@@ -0,0 +1,193 @@
+import re
+from io import StringIO
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from rich.console import Console, RenderableType
+from rich.markdown import Markdown
+
+from hey.cli import (
+    _add_chat_arguments,
+    _build_parser,
+    _list_contexts,
+    _make_snippet,
+    _MarkdownBlockScanner,
+    _parse_args,
+    _parse_range_param,
+    _search_contexts,
+    _show_history,
+    _StreamingMarkdown,
+    _truncate_lines,
+    _write_stream,
+)
+from hey.context import Context, ContextClient
+
+_DATETIME = r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}"
+
+
+@pytest.mark.parametrize(
+    "content, position, expected",
+    [
+        ("hello world", 6, "hello world"),
+        ("0123456789abcdefghij", 15, "...56789abcdefghij"),
+        ("x" * 120, 0, "x" * 100 + "..."),
+        ("x" * 50 + "query" + "y" * 100, 50, "..." + "x" * 10 + "query" + "y" * 82 + "..."),
+    ],
+)
+def test_make_snippet(content: str, position: int, expected: str) -> None:
+    assert _make_snippet(content, position) == expected
+
+
+@pytest.mark.parametrize(
+    "rangeparam, expected",
+    [
+        (":", slice(None, None)),
+        ("2:", slice(2, None)),
+        (":10", slice(None, 10)),
+        ("-5:-1", slice(-5, -1)),
+    ],
+)
+def test_parse_range_param(rangeparam: str, expected: slice) -> None:
+    assert _parse_range_param(rangeparam) == expected
+
+
+@pytest.mark.parametrize("rangeparam", ["", "3", "1:2:3", "a:b"])
+def test_parse_range_param_with_invalid_value(rangeparam: str) -> None:
+    with pytest.raises(ValueError):
+        _parse_range_param(rangeparam)
+
+
+@pytest.mark.parametrize(
+    "text, max_lines, expected",
+    [
+        ("a\nb\nc", 3, "a\nb\nc"),
+        ("a\nb\nc\n", 3, "a\nb\nc\n"),
+        ("a\nb\nc\nd", 3, "a\nb..."),
+        ("a\n\n\nb", 2, "a..."),
+    ],
+)
+def test_truncate_lines(text: str, max_lines: int, expected: str) -> None:
+    assert _truncate_lines(text, max_lines) == expected
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("para\n\nnext\n", 6),
+        ("para\n\nnext", 0),
+        ("a\n\nb\n\nc\n", 6),
+        ("```\ncode\n\nmore\n", 0),
+        ("```\ncode\n```\n\nnext\n", 14),
+        ("- a\n\n- b\n", 0),
+        ("1. a\n\n2. b\n", 0),
+        ("    code\n\n    more\n", 0),
+    ],
+)
+def test_markdown_block_scanner(text: str, expected: int) -> None:
+    assert _MarkdownBlockScanner().feed(text) == expected
+
+
+def test_markdown_block_scanner_feeds_incrementally() -> None:
+    text = "para\n\n```\ncode\n\nmore\n```\n\nnext\n\nlast\n"
+    scanner = _MarkdownBlockScanner()
+    boundaries = [scanner.feed(text[:end]) for end in range(1, len(text) + 1)]
+    assert boundaries[-1] == _MarkdownBlockScanner().feed(text) == text.index("last")
+    assert boundaries == sorted(boundaries)
+
+
+def test_markdown_block_scanner_in_long_open_fence() -> None:
+    text = "intro\n\n```python\n" + "x = 1\n\n" * 5000
+    scanner = _MarkdownBlockScanner()
+    for end in [*range(len(text) // 100, len(text), len(text) // 100), len(text)]:
+        assert scanner.feed(text[:end]) == text.index("```")
+    # Each call only scans the lines added since the previous one.
+    assert scanner._position == len(text)
+
+
+def _render_to_text(renderable: RenderableType) -> str:
+    output = StringIO()
+    Console(file=output, width=60, force_terminal=True, color_system="truecolor").print(renderable)
+    return output.getvalue()
+
+
+def test_streaming_markdown_renders_like_full_parse() -> None:
+    text = "# Title\n\nSome *text*.\n\n- item\n\n- item\n\n```python\nx = 1\n\ny = 2\n```\n\n> quote\n\nlast **line**\n"
+    streaming_markdown = _StreamingMarkdown()
+    for end in range(1, len(text) + 1):
+        markdown = streaming_markdown.render(text[:end])
+        if text.startswith("\n\n", end - 2):
+            assert _render_to_text(markdown) == _render_to_text(Markdown(text[:end]))
+    assert streaming_markdown._committed_length == text.index("last")
+
+
+@pytest.mark.parametrize("argv", [[], ["hello"], ["hello", "world"]])
+def test_parse_args_without_options_matches_parser(argv: list[str]) -> None:
+    parser = _build_parser()
+    _add_chat_arguments(parser)
+    assert _parse_args(None, argv) == parser.parse_args(argv)
+
+
+def test_parse_args_resolves_abbreviations_against_all_options() -> None:
+    assert _parse_args(None, ["--hist"]).history
+    with pytest.raises(SystemExit):
+        _parse_args(None, ["--h"])
+
+
+@pytest.fixture
+def client(tmp_path: Path) -> ContextClient:
+    client = ContextClient(tmp_path / "context.db")
+    with client:
+        client.create_context(
+            "first",
+            [
+                {"role": "system", "content": "Be  brief."},
+                {"role": "user", "content": "Hello,\nPython!"},
+                {"role": "assistant", "content": "x" * 120},
+                {"role": "user", "content": "not shown"},
+            ],
+        )
+        client.create_context("second", [{"role": "user", "content": "Ruby or python?"}])
+    return client
+
+
+def test_list_contexts_plain(client: ContextClient, capsys: pytest.CaptureFixture[str]) -> None:
+    _list_contexts(client, ":", plain=True)
+
+    lines = capsys.readouterr().out.splitlines()
+    assert re.fullmatch(rf"1\tfirst\t{_DATETIME}", lines[0])
+    assert lines[1:4] == ["    system: Be brief.", "    user: Hello, Python!", f"    assistant: {'x' * 100}..."]
+    assert re.fullmatch(rf"2\tsecond\t{_DATETIME}", lines[4])
+    assert lines[5:] == ["    user: Ruby or python?"]
+
+
+def test_search_contexts_plain(client: ContextClient, capsys: pytest.CaptureFixture[str]) -> None:
+    _search_contexts(client, "Python", plain=True)
+
+    lines = capsys.readouterr().out.splitlines()
+    assert re.fullmatch(rf"1\tfirst\t{_DATETIME}", lines[0])
+    assert lines[1:2] == ["    user: Hello, Python!"]
+    # The second context only matches case-insensitively, so it has no snippet.
+    assert re.fullmatch(rf"2\tsecond\t{_DATETIME}", lines[2])
+    assert lines[3:] == []
+
+
+def test_show_history_plain(capsys: pytest.CaptureFixture[str]) -> None:
+    _show_history(
+        Context(id=1, title="first"),
+        [{"role": "user", "content": "Hello,\nPython!"}, {"role": "assistant", "content": ""}],
+        plain=True,
+    )
+
+    assert capsys.readouterr().out == "[1: first]\n\nuser:\n    Hello,\n    Python!\n\n"
+
+
+def test_write_stream(capsys: pytest.CaptureFixture[str]) -> None:
+    def chunk(content: str | None) -> Any:
+        return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+    response = _write_stream([chunk("# Hello"), chunk(None), chunk(", *world*"), chunk("!")])
+
+    assert response == "# Hello, *world*!"
+    assert capsys.readouterr().out == "# Hello, *world*!\n"
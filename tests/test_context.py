@@ -0,0 +1,172 @@
+import sqlite3
+from pathlib import Path
+
+from hey.context import ContextClient
+
+
+def test_delete_contexts(tmp_path: Path) -> None:
+    client = ContextClient(tmp_path / "context.db")
+    with client:
+        contexts = [client.create_context(f"context-{i}", [{"role": "user", "content": "hello"}]) for i in range(3)]
+        context_ids = [context.id for context in contexts]
+        assert context_ids[1] is not None and context_ids[2] is not None
+        client.delete_contexts([contexts[0], context_ids[1]])
+
+    with client:
+        assert [context.id for context in client.get_contexts()] == context_ids[2:]
+        assert [message.context_id for message in client.get_messages(context_ids[2])] == context_ids[2:]
+
+
+def test_search_messages(tmp_path: Path) -> None:
+    client = ContextClient(tmp_path / "context.db")
+    with client:
+        context = client.create_context("context", [{"role": "user", "content": "日本語で Python"}])
+        client.add_messages(context, [{"role": "assistant", "content": "PYTHON"}, {"role": "user", "content": "ruby"}])
+        hits = [(hit.title, message.content, position) for hit, message, position in client.search_messages("Python")]
+
+    assert hits == [("context", "日本語で Python", 5), ("context", "PYTHON", -1)]
+
+
+def test_get_contexts_with_preview(tmp_path: Path) -> None:
+    client = ContextClient(tmp_path / "context.db")
+    with client:
+        client.create_context("zeroth", [{"role": "user", "content": "skipped"}])
+        client.create_context("first", [{"role": "user", "content": str(i)} for i in range(5)])
+        client.create_context("second", [{"role": "assistant", "content": "a"}])
+        client.create_context("third")
+        client.create_context("fourth", [{"role": "user", "content": "skipped"}])
+        rows = client.get_contexts_with_preview(offset=1, limit=3, preview_limit=3)
+
+        assert [(context.title, messages) for context, messages in rows] == [
+            ("first", [("user", "0"), ("user", "1"), ("user", "2")]),
+            ("second", [("assistant", "a")]),
+            ("third", []),
+        ]
+
+        rows = client.get_contexts_with_preview(limit=1, preview_length=3)
+        assert [(context.title, messages) for context, messages in rows] == [("zeroth", [("user", "ski")])]
+
+        rows = client.get_contexts_with_preview(offset=1, limit=2, from_end=True, preview_limit=1)
+        assert [(context.title, messages) for context, messages in rows] == [
+            ("second", [("assistant", "a")]),
+            ("third", []),
+        ]
+
+
+def _count_preview_steps(client: ContextClient) -> int:
+    steps = 0
+
+    def handler() -> int:
+        nonlocal steps
+        steps += 1
+        return 0
+
+    connection = client._session.connection().connection.driver_connection
+    assert connection is not None
+    connection.set_progress_handler(handler, 1)
+    try:
+        client.get_contexts_with_preview(preview_limit=3)
+    finally:
+        connection.set_progress_handler(None, 1)
+    return steps
+
+
+def test_get_contexts_with_preview_does_not_scan_long_contexts(tmp_path: Path) -> None:
+    client = ContextClient(tmp_path / "context.db")
+    with client:
+        context = client.create_context("long", [{"role": "user", "content": str(i)} for i in range(10)])
+        short_steps = _count_preview_steps(client)
+
+        client.add_messages(context, [{"role": "user", "content": str(i)} for i in range(10, 5000)])
+        long_steps = _count_preview_steps(client)
+
+        assert long_steps < 2 * short_steps + 100
+        rows = client.get_contexts_with_preview(preview_limit=3)
+        assert [messages for _, messages in rows] == [[("user", "0"), ("user", "1"), ("user", "2")]]
+
+
+def test_delete_last_turn(tmp_path: Path) -> None:
+    client = ContextClient(tmp_path / "context.db")
+    with client:
+        context = client.create_context("context", [{"role": "system", "content": "system"}])
+        client.add_messages(
+            context,
+            [
+                {"role": "user", "content": "first"},
+                {"role": "assistant", "content": "first answer"},
+                {"role": "user", "content": "second"},
+                {"role": "assistant", "content": "second answer"},
+                {"role": "assistant", "content": "second answer (continued)"},
+            ],
+        )
+
+        assert client.delete_last_turn(context) == 3
+        assert [message.content for message in client.get_messages(context)] == ["system", "first", "first answer"]
+
+
+def test_search_messages_after_changes(tmp_path: Path) -> None:
+    client = ContextClient(tmp_path / "context.db")
+    with client:
+        first = client.create_context("first", [{"role": "user", "content": "python and go"}])
+        client.create_context("second", [{"role": "user", "content": "go and python"}])
+        client.delete_contexts([first])
+        hits = [(hit.title, message.content) for hit, message, _ in client.search_messages("python")]
+        short_hits = [(hit.title, message.content) for hit, message, _ in client.search_messages("go")]
+
+    assert hits == short_hits == [("second", "go and python")]
+
+
+def test_nested_sessions_share_the_outer_session(tmp_path: Path) -> None:
+    client = ContextClient(tmp_path / "context.db")
+    with client:
+        context = client.create_context("context")
+        with client:
+            client.rename_context(context, "renamed")
+        assert context.title == "renamed"
+
+
+def test_add_messages_without_insert_returning(tmp_path: Path) -> None:
+    client = ContextClient(tmp_path / "context.db")
+    client._engine.dialect.insert_returning = False  # as on SQLite < 3.35
+    with client:
+        context = client.create_context("context", [{"role": "system", "content": "system"}])
+        client.add_messages(context, [{"role": "user", "content": "hello"}])
+        assert [message.content for message in client.get_messages(context)] == ["system", "hello"]
+
+
+def test_upgrade_existing_database(tmp_path: Path) -> None:
+    # A database as created before the schema was versioned: no FTS table and an index
+    # that later versions replace.
+    with sqlite3.connect(tmp_path / "context.db") as connection:
+        connection.executescript(
+            """
+            CREATE TABLE contexts (
+                id INTEGER NOT NULL, title VARCHAR NOT NULL, created_at DATETIME NOT NULL, PRIMARY KEY (id)
+            );
+            CREATE TABLE messages (
+                id INTEGER NOT NULL, context_id INTEGER NOT NULL, role VARCHAR NOT NULL, content VARCHAR NOT NULL,
+                created_at DATETIME NOT NULL, updated_at DATETIME NOT NULL,
+                PRIMARY KEY (id), FOREIGN KEY(context_id) REFERENCES contexts (id)
+            );
+            CREATE INDEX ix_messages_context_id_created_at ON messages (context_id, created_at);
+            INSERT INTO contexts VALUES (1, 'old', '2024-01-01 00:00:00.000000');
+            INSERT INTO messages VALUES
+                (1, 1, 'user', 'How do I use Python?', '2024-01-01 00:00:00.000000', '2024-01-01 00:00:00.000000');
+            """
+        )
+    connection.close()
+
+    client = ContextClient(tmp_path / "context.db")
+    with client:
+        hits = [(hit.title, message.content, position) for hit, message, position in client.search_messages("Python")]
+    assert hits == [("old", "How do I use Python?", 13)]
+
+    connection = sqlite3.connect(tmp_path / "context.db")
+    try:
+        names = {name for (name,) in connection.execute("SELECT name FROM sqlite_master")}
+        (user_version,) = connection.execute("PRAGMA user_version").fetchone()
+    finally:
+        connection.close()
+    assert {"ix_contexts_created_at", "ix_messages_context_id", "messages_fts"} <= names
+    assert "ix_messages_context_id_created_at" not in names
+    assert user_version == ContextClient.SCHEMA_VERSION
@@ -0,0 +1,70 @@
+import datetime
+import stat
+from pathlib import Path
+
+import pytest
+
+from hey import settings as settings_module
+from hey.settings import Profile, _parse_timedelta, load_settings
+
+
+def test_load_settings_reuses_cache_until_file_changes(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings_module, "HEY_SETTINGS_CACHE_FILE", tmp_path / "config.cache")
+    config_file = tmp_path / "config.yml"
+    config_file.write_text("profiles:\n  work:\n    model: gpt-4\n")
+
+    assert load_settings(config_file).profiles["work"].model == "gpt-4"
+    assert (tmp_path / "config.cache").exists()
+    assert load_settings(config_file).profiles["work"].model == "gpt-4"
+
+    config_file.write_text("profiles:\n  work:\n    model: gpt-4o-mini\n")
+    settings = load_settings(config_file)
+    assert settings.profiles["work"].model == "gpt-4o-mini"
+    assert set(settings.profiles) == {"work", "default"}
+
+
+def test_load_settings_cache_is_private(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    cache_file = tmp_path / "config.cache"
+    monkeypatch.setattr(settings_module, "HEY_SETTINGS_CACHE_FILE", cache_file)
+    cache_file.write_bytes(b"")
+    cache_file.chmod(0o644)
+    config_file = tmp_path / "config.yml"
+    config_file.write_text("profiles:\n  work:\n    api_key: secret\n")
+
+    assert load_settings(config_file).profiles["work"].api_key == "secret"
+    assert stat.S_IMODE(cache_file.stat().st_mode) == 0o600
+
+
+def test_load_settings_ignores_unknown_keys(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings_module, "HEY_SETTINGS_CACHE_FILE", tmp_path / "config.cache")
+    config_file = tmp_path / "config.yml"
+    config_file.write_text("profiles:\n  work:\n    temperature: 0\n    unknown: 1\nsuggest_new_context_after: 3600\n")
+
+    settings = load_settings(config_file)
+    assert settings.profiles["work"] == Profile(temperature=0.0)
+    assert settings.suggest_new_context_after == datetime.timedelta(hours=1)
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        (90, datetime.timedelta(seconds=90)),
+        (90.5, datetime.timedelta(seconds=90.5)),
+        ("01:30:00", datetime.timedelta(hours=1, minutes=30)),
+        ("1 days 01:00:00", datetime.timedelta(days=1, hours=1)),
+        ("-1 day, 23:00:00", datetime.timedelta(days=-2, hours=1)),
+        ("1d", datetime.timedelta(days=1)),
+        ("P1DT12H", datetime.timedelta(days=1, hours=12)),
+        ("PT30M", datetime.timedelta(minutes=30)),
+        ("P1W", datetime.timedelta(weeks=1)),
+        ("-P1D", datetime.timedelta(days=-1)),
+    ],
+)
+def test_parse_timedelta(value: float | str, expected: datetime.timedelta) -> None:
+    assert _parse_timedelta(value) == expected
+
+
+@pytest.mark.parametrize("value", ["P", "abc", "1 hour", "10:75", "3600.5", "2 days, 0:00"])
+def test_parse_timedelta_invalid(value: str) -> None:
+    with pytest.raises(ValueError):
+        _parse_timedelta(value)